@@ -2,6 +2,9 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 import pandas as pd
 import joblib
+import sqlite3
+
+import score_index
 
 app = Flask(__name__)
 CORS(app)
@@ -172,5 +175,78 @@ def predict():
         return jsonify({"error": str(e)}), 500
 
 
+def open_index():
+    """Open the risk index; returns (con, info) or (None, error response)."""
+    try:
+        con = score_index.connect()
+        info = score_index.index_info(con)
+    except (FileNotFoundError, sqlite3.Error) as e:
+        return None, (jsonify({"error": f"Risk index unavailable, rerun train.py: {e}"}), 503)
+    return con, info
+
+
+@app.get("/risk/info")
+def risk_info():
+    """Where the indexed scores come from, and whether the index is stale."""
+    con, info = open_index()
+    if con is None:
+        return info
+    con.close()
+    return jsonify(info)
+
+
+@app.get("/risk/<int:id_student>")
+def risk(id_student):
+    """Precomputed risk for a student; optional ?module=&presentation= filters."""
+    con, info = open_index()
+    if con is None:
+        return info
+
+    try:
+        rows = score_index.lookup(
+            con, id_student,
+            code_module=request.args.get("module"),
+            code_presentation=request.args.get("presentation"),
+        )
+    finally:
+        con.close()
+
+    if not rows:
+        return jsonify({
+            "error": f"No {info['source']} score for student {id_student}",
+            "index": info,
+        }), 404
+    return jsonify({"results": rows, "index": info})
+
+
+@app.get("/risk/top")
+def risk_top():
+    """Top-N highest-risk students of a module (?module=&n=&presentation=)."""
+    module = request.args.get("module")
+    if module is None:
+        return jsonify({"error": "Missing 'module' query parameter"}), 400
+    try:
+        n = int(request.args.get("n", 10))
+    except ValueError:
+        return jsonify({"error": "'n' must be an integer"}), 400
+    if n < 1:
+        return jsonify({"error": "'n' must be at least 1"}), 400
+    n = min(n, score_index.MAX_TOP_N)
+
+    con, info = open_index()
+    if con is None:
+        return info
+
+    try:
+        rows = score_index.top_n(
+            con, module, n=n,
+            code_presentation=request.args.get("presentation"),
+        )
+    finally:
+        con.close()
+
+    return jsonify({"results": rows, "index": info})
+
+
 if __name__ == "__main__":
     app.run(debug=True)
@@ -1,4 +1,6 @@
 import os
+import json
+import argparse
 import joblib
 import numpy as np
 import pandas as pd
@@ -56,17 +58,54 @@ def load():
 # ---------------------------------------------------------
 # EVALUATION PIPELINE
 # ---------------------------------------------------------
-def evaluate_model():
-    model, X, y = load()
-
-    # Train-test split (20% hold-out test set)
+def load_train_meta():
+    path = os.path.join(MODEL_DIR, "train_meta.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_oof():
+    """Out-of-fold predictions, only if the saved model came from train.py --cv."""
+    mode = load_train_meta().get("mode")
+    if mode != "cv":
+        raise ValueError(
+            f"Saved model was not trained with --cv (mode: {mode}); "
+            "any oof_predictions.parquet is left over from an older run"
+        )
+    oof_path = os.path.join(MODEL_DIR, "oof_predictions.parquet")
+    if not os.path.exists(oof_path):
+        raise FileNotFoundError("OOF predictions not found (run train.py --cv K): " + oof_path)
+    return pd.read_parquet(oof_path)
+
+
+def evaluate_holdout(model, X, y):
+    # Train-test split (20% hold-out test set, same as train.py)
     print("\nCreating test split...")
     X_train, X_test, y_train, y_test = train_test_split(
         X, y, test_size=0.2, stratify=y, random_state=42
     )
 
     print("\nEvaluating model...")
-    y_proba = model.predict_proba(X_test)[:, 1]
+    return y_test, model.predict_proba(X_test)[:, 1]
+
+
+def evaluate_model():
+    meta = load_train_meta()
+    model, X, y = load()
+
+    if meta.get("mode") == "cv":
+        # A model from train.py --cv was refit on every row, so a hold-out
+        # split would be in-sample. Curves use the out-of-fold scores instead.
+        print("\nModel was trained with --cv; using out-of-fold predictions...")
+        oof = load_oof()
+        col = "xgb_proba" if meta.get("model") == "xgboost" else "rf_proba"
+        y_test = oof["dropout"].astype(int)
+        y_proba = oof[col].to_numpy()
+    else:
+        y_test, y_proba = evaluate_holdout(model, X, y)
+
     y_pred = (y_proba >= 0.5).astype(int)
 
     # -----------------------------------------------------
@@ -147,8 +186,43 @@ def evaluate_model():
     print("\n=== Evaluation Complete ===")
 
 
+# ---------------------------------------------------------
+# THRESHOLD SELECTION FROM OUT-OF-FOLD PREDICTIONS
+# ---------------------------------------------------------
+def evaluate_oof():
+    """Compare RF vs XGBoost F1-optimal thresholds on train.py --cv OOF predictions."""
+    print("Loading out-of-fold predictions...")
+    oof = load_oof()
+    y = oof["dropout"].astype(int)
+
+    for name, col in [("RandomForest", "rf_proba"), ("XGBoost", "xgb_proba")]:
+        y_proba = oof[col]
+
+        prec, rec, th = precision_recall_curve(y, y_proba)
+        f1_scores = 2 * (prec * rec) / (prec + rec + 1e-9)
+        best_idx = np.argmax(f1_scores[:-1])
+
+        print(f"\n=== {name} (out-of-fold) ===")
+        print("ROC AUC:", roc_auc_score(y, y_proba))
+        print("PR AUC:", auc(rec, prec))
+        print("Best threshold (F1):", float(th[best_idx]))
+        print("Precision:", float(prec[best_idx]))
+        print("Recall:", float(rec[best_idx]))
+        print("F1:", float(f1_scores[best_idx]))
+
+    print("\n=== OOF Evaluation Complete ===")
+
+
 # ---------------------------------------------------------
 # MAIN
 # ---------------------------------------------------------
 if __name__ == "__main__":
-    evaluate_model()
+    parser = argparse.ArgumentParser(description="Evaluate the saved model.")
+    parser.add_argument("--oof", action="store_true",
+                        help="select thresholds from out-of-fold predictions instead")
+    args = parser.parse_args()
+
+    if args.oof:
+        evaluate_oof()
+    else:
+        evaluate_model()
@@ -0,0 +1,204 @@
+import os
+import json
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+
+# Paths
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROC_DIR = os.path.join(ROOT, "data", "processed")
+MODEL_DIR = os.path.join(ROOT, "models")
+INDEX_PATH = os.path.join(MODEL_DIR, "risk_index.sqlite")
+
+KEY_COLS = ["id_student", "code_module", "code_presentation"]
+MAX_TOP_N = 1000
+
+
+# ---------------------------------------------------------
+# HELD-OUT SCORES
+# ---------------------------------------------------------
+def load_heldout_scores(df):
+    """
+    Out-of-sample scores of the saved model's type, aligned with df.
+
+    Split mode (train.py): the 20% validation rows, scored by the saved model
+    which never saw them. CV mode (train.py --cv): out-of-fold scores for
+    every row. Returns (keys, scores, meta) where keys is a subset of df's
+    key columns. Raises ValueError if the predictions don't match df.
+    """
+    meta_path = os.path.join(MODEL_DIR, "train_meta.json")
+    if not os.path.exists(meta_path):
+        raise FileNotFoundError("Training metadata not found (run train.py): " + meta_path)
+    with open(meta_path) as f:
+        meta = json.load(f)
+
+    mode = meta.get("mode")
+    if mode == "cv":
+        pred_path = os.path.join(MODEL_DIR, "oof_predictions.parquet")
+        rerun = "train.py --cv K"
+    else:
+        pred_path = os.path.join(MODEL_DIR, "holdout_predictions.parquet")
+        rerun = "train.py"
+    if not os.path.exists(pred_path):
+        raise FileNotFoundError(f"Predictions not found (rerun {rerun}): {pred_path}")
+
+    col = "xgb_proba" if meta.get("model") == "xgboost" else "rf_proba"
+    pred = pd.read_parquet(pred_path, columns=KEY_COLS + [col])
+
+    stale = f"{os.path.basename(pred_path)} is out of date with the dataset, rerun {rerun}"
+    if pred.duplicated(KEY_COLS).any():
+        raise ValueError(stale + " (duplicate keys)")
+
+    merged = df[KEY_COLS].merge(pred, on=KEY_COLS, how="left", indicator=True)
+    n_matched = int((merged["_merge"] == "both").sum())
+    if n_matched != len(pred):
+        raise ValueError(stale + f" ({len(pred) - n_matched} keys not in dataset)")
+    if mode == "cv" and n_matched != len(df):
+        raise ValueError(stale + f" ({len(df) - n_matched} rows without a score)")
+
+    merged = merged[merged["_merge"] == "both"]
+    return merged[KEY_COLS], merged[col].to_numpy(dtype=float), meta
+
+
+# ---------------------------------------------------------
+# BUILD INDEX
+# ---------------------------------------------------------
+def build_index(df=None, out_path=INDEX_PATH):
+    """
+    Write the held-out scores (see load_heldout_scores) to a SQLite index
+    keyed by (id_student, code_module, code_presentation), plus a meta table
+    recording the score source, model and build time.
+
+    The file is written next to the target and swapped in with os.replace,
+    so a running service never reads a half-built index.
+    """
+    if df is None:
+        df = pd.read_parquet(os.path.join(PROC_DIR, "oulad_per_student.parquet"))
+
+    keys, scores, train_meta = load_heldout_scores(df)
+    source = "oof" if train_meta.get("mode") == "cv" else "holdout"
+
+    rows = zip(
+        keys["id_student"].astype(int).tolist(),
+        keys["code_module"].astype(str).tolist(),
+        keys["code_presentation"].astype(str).tolist(),
+        scores.tolist(),
+    )
+
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    tmp_path = out_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    con = sqlite3.connect(tmp_path)
+    try:
+        con.execute("""
+            CREATE TABLE risk (
+                id_student INTEGER NOT NULL,
+                code_module TEXT NOT NULL,
+                code_presentation TEXT NOT NULL,
+                risk_score REAL NOT NULL,
+                PRIMARY KEY (id_student, code_module, code_presentation)
+            ) WITHOUT ROWID
+        """)
+        # INSERT OR REPLACE: duplicate keys in the parquet keep the last score
+        con.executemany("INSERT OR REPLACE INTO risk VALUES (?, ?, ?, ?)", rows)
+        con.execute(
+            "CREATE INDEX idx_module_risk ON risk (code_module, risk_score DESC)"
+        )
+        n_rows = con.execute("SELECT COUNT(*) FROM risk").fetchone()[0]
+
+        con.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        con.executemany("INSERT INTO meta VALUES (?, ?)", [
+            ("source", source),
+            ("model", str(train_meta.get("model"))),
+            ("built_at", datetime.now(timezone.utc).isoformat(timespec="seconds")),
+            ("model_mtime", repr(_model_mtime())),
+            ("n_rows", str(n_rows)),
+            ("n_dataset_rows", str(len(df))),
+        ])
+        con.commit()
+    finally:
+        con.close()
+
+    os.replace(tmp_path, out_path)
+    if n_rows < len(keys):
+        print(f"WARNING: {len(keys) - n_rows} duplicate keys collapsed in risk index")
+    print(f"Saved risk index ({n_rows} {source} scores of {len(df)} rows) → {out_path}")
+    return out_path
+
+
+def _model_mtime():
+    path = os.path.join(MODEL_DIR, "best_model.joblib")
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+
+# ---------------------------------------------------------
+# LOOKUPS
+# ---------------------------------------------------------
+def connect(path=INDEX_PATH):
+    """Open the index read-only. Raises FileNotFoundError if not built yet."""
+    if not os.path.exists(path):
+        raise FileNotFoundError("Risk index not found: " + path)
+    return sqlite3.connect(Path(path).as_uri() + "?mode=ro", uri=True)
+
+
+def index_info(con):
+    """
+    Index metadata (source, model, built_at, ...). "stale" is True when
+    best_model.joblib changed after the index was built.
+    """
+    info = dict(con.execute("SELECT key, value FROM meta"))
+    info["n_rows"] = int(info["n_rows"])
+    info["n_dataset_rows"] = int(info["n_dataset_rows"])
+    info["stale"] = info.pop("model_mtime") != repr(_model_mtime())
+    return info
+
+
+def lookup(con, id_student, code_module=None, code_presentation=None):
+    """Return all indexed enrolments of a student, optionally filtered."""
+    sql = ("SELECT id_student, code_module, code_presentation, risk_score "
+           "FROM risk WHERE id_student = ?")
+    params = [int(id_student)]
+    if code_module is not None:
+        sql += " AND code_module = ?"
+        params.append(code_module)
+    if code_presentation is not None:
+        sql += " AND code_presentation = ?"
+        params.append(code_presentation)
+    return [_row_to_dict(r) for r in con.execute(sql, params)]
+
+
+def top_n(con, code_module, n=10, code_presentation=None):
+    """Return the n highest-risk enrolments of a module (1 <= n <= MAX_TOP_N)."""
+    n = int(n)
+    # SQLite treats a negative LIMIT as "no limit"
+    if not 1 <= n <= MAX_TOP_N:
+        raise ValueError(f"n must be between 1 and {MAX_TOP_N}")
+    sql = ("SELECT id_student, code_module, code_presentation, risk_score "
+           "FROM risk WHERE code_module = ?")
+    params = [code_module]
+    if code_presentation is not None:
+        sql += " AND code_presentation = ?"
+        params.append(code_presentation)
+    sql += " ORDER BY risk_score DESC LIMIT ?"
+    params.append(n)
+    return [_row_to_dict(r) for r in con.execute(sql, params)]
+
+
+def _row_to_dict(row):
+    return {
+        "id_student": row[0],
+        "code_module": row[1],
+        "code_presentation": row[2],
+        "risk_score": row[3],
+    }
+
+
+# ---------------------------------------------------------
+# MAIN
+# ---------------------------------------------------------
+if __name__ == "__main__":
+    build_index()
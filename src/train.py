@@ -1,9 +1,13 @@
 import os
+import json
+import argparse
 import joblib
 import numpy as np
 import pandas as pd
 
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import (
+    train_test_split, StratifiedKFold, StratifiedGroupKFold
+)
 from sklearn.metrics import (
     classification_report, roc_auc_score, recall_score
 )
@@ -12,6 +16,9 @@ from sklearn.ensemble import RandomForestClassifier
 from xgboost import XGBClassifier
 
 from imblearn.over_sampling import SMOTE
+from joblib import Parallel, delayed, cpu_count
+
+from score_index import build_index, KEY_COLS
 
 # Detect project paths
 ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -39,6 +46,13 @@ def clean_columns(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+def save_train_meta(mode, best_name):
+    """Record how best_model.joblib was trained so evaluate.py can check it."""
+    path = os.path.join(MODEL_DIR, "train_meta.json")
+    with open(path, "w") as f:
+        json.dump({"mode": mode, "model": best_name}, f)
+
+
 def load_data():
     path = os.path.join(PROC_DIR, "oulad_per_student.parquet")
     if not os.path.exists(path):
@@ -47,15 +61,32 @@ def load_data():
     return df
 
 
-# -------------------------------------------------------------
-# TRAINING PIPELINE
-# -------------------------------------------------------------
+def make_rf(n_jobs=-1):
+    return RandomForestClassifier(
+        n_estimators=300,
+        max_depth=None,
+        class_weight="balanced",
+        n_jobs=n_jobs,
+        random_state=42
+    )
 
-def train():
 
-    print("\nLoading data...")
-    df = load_data()
+def make_xgb(scale_pos_weight, n_jobs=-1):
+    return XGBClassifier(
+        n_estimators=400,
+        learning_rate=0.05,
+        max_depth=6,
+        subsample=0.9,
+        colsample_bytree=0.9,
+        random_state=42,
+        scale_pos_weight=scale_pos_weight,
+        eval_metric="logloss",
+        tree_method="hist",  # best for large tabular data
+        n_jobs=n_jobs
+    )
+
 
+def prepare_xy(df):
     # Drop identifiers from X
     drop_cols = ["dropout", "id_student", "code_module", "code_presentation"]
     X = df.drop(columns=drop_cols, errors="ignore")
@@ -64,17 +95,31 @@ def train():
     # Clean feature names
     X = clean_columns(X)
 
-    print("\nTrain/Val Split...")
-    X_train, X_val, y_train, y_val = train_test_split(
-        X, y, test_size=0.2, stratify=y, random_state=42
-    )
-
     # Check for remaining non-numeric columns
-    non_numeric = X_train.select_dtypes(include=["object"]).columns.tolist()
+    non_numeric = X.select_dtypes(include=["object"]).columns.tolist()
     if len(non_numeric) > 0:
         print("\nERROR: Non-numeric columns still present:", non_numeric)
         raise ValueError("Fix preprocessing; SMOTE/XGBoost require numeric.")
 
+    return X, y
+
+
+# -------------------------------------------------------------
+# TRAINING PIPELINE
+# -------------------------------------------------------------
+
+def train():
+
+    print("\nLoading data...")
+    df = load_data()
+
+    X, y = prepare_xy(df)
+
+    print("\nTrain/Val Split...")
+    X_train, X_val, y_train, y_val = train_test_split(
+        X, y, test_size=0.2, stratify=y, random_state=42
+    )
+
     # ---------------------------------------------------------
     # SMOTE Oversampling
     # ---------------------------------------------------------
@@ -92,13 +137,7 @@ def train():
     # MODEL 1 — RANDOM FOREST
     # ---------------------------------------------------------
     print("\nTraining RandomForest...")
-    rf = RandomForestClassifier(
-        n_estimators=300,
-        max_depth=None,
-        class_weight="balanced",
-        n_jobs=-1,
-        random_state=42
-    )
+    rf = make_rf()
     rf.fit(X_sm, y_sm)
 
     rf_preds = rf.predict(X_val)
@@ -118,17 +157,7 @@ def train():
     neg, pos = np.bincount(y_train)
     scale_pos_weight = neg / pos
 
-    xgb = XGBClassifier(
-        n_estimators=400,
-        learning_rate=0.05,
-        max_depth=6,
-        subsample=0.9,
-        colsample_bytree=0.9,
-        random_state=42,
-        scale_pos_weight=scale_pos_weight,
-        eval_metric="logloss",
-        tree_method="hist"  # best for large tabular data
-    )
+    xgb = make_xgb(scale_pos_weight)
 
     xgb.fit(X_sm, y_sm)
 
@@ -155,8 +184,190 @@ def train():
     out_path = os.path.join(MODEL_DIR, "best_model.joblib")
     joblib.dump(best, out_path)
 
+    save_train_meta("split", best_name)
+    print(f"\nSaved BEST model ({best_name}) → {out_path}")
+
+    # Validation-row scores are the only ones the saved model hasn't seen
+    holdout = df.loc[X_val.index, KEY_COLS].copy()
+    holdout["dropout"] = y_val.values
+    holdout["rf_proba"] = rf_proba
+    holdout["xgb_proba"] = xgb_proba
+
+    holdout_path = os.path.join(MODEL_DIR, "holdout_predictions.parquet")
+    holdout.to_parquet(holdout_path, index=False)
+    print(f"Saved hold-out predictions → {holdout_path}")
+
+    # Precompute held-out scores so /risk lookups skip the model
+    print("\nBuilding risk index...")
+    build_index(df)
+
+
+# -------------------------------------------------------------
+# CROSS-VALIDATED TRAINING PIPELINE
+# -------------------------------------------------------------
+
+def fit_fold(fold, X, y, train_idx, val_idx, n_threads):
+    """
+    Train RF + XGBoost on one fold and return out-of-fold probabilities.
+    SMOTE is applied to the training part of the fold only.
+    """
+    X_train, y_train = X.iloc[train_idx], y.iloc[train_idx]
+    X_val = X.iloc[val_idx]
+
+    sm = SMOTE(random_state=42)
+    X_sm, y_sm = sm.fit_resample(X_train, y_train)
+
+    rf = make_rf(n_jobs=n_threads)
+    rf.fit(X_sm, y_sm)
+
+    neg, pos = np.bincount(y_train)
+    xgb = make_xgb(neg / pos, n_jobs=n_threads)
+    xgb.fit(X_sm, y_sm)
+
+    print(f"Fold {fold} done ({len(train_idx)} train / {len(val_idx)} val)")
+    return (
+        fold,
+        val_idx,
+        rf.predict_proba(X_val)[:, 1],
+        xgb.predict_proba(X_val)[:, 1],
+    )
+
+
+def fit_full(name, X, y, n_threads):
+    """Train one candidate model on all data (SMOTE applied), for the final refit."""
+    sm = SMOTE(random_state=42)
+    X_sm, y_sm = sm.fit_resample(X, y)
+
+    if name == "xgboost":
+        neg, pos = np.bincount(y)
+        model = make_xgb(neg / pos, n_jobs=n_threads)
+    else:
+        model = make_rf(n_jobs=n_threads)
+    model.fit(X_sm, y_sm)
+
+    print(f"Full-data {name} done")
+    return model
+
+
+def train_cv(n_splits=5, group=False, n_jobs=-1):
+    """
+    Stratified K-fold training with folds running in parallel processes.
+
+    group=True keeps all enrolments of an id_student in the same fold.
+    Out-of-fold probabilities are saved to models/oof_predictions.parquet.
+    Both candidates are also fit on all data in the same parallel run, and
+    the one with the best OOF recall is saved.
+    """
+    print("\nLoading data...")
+    df = load_data()
+    X, y = prepare_xy(df)
+
+    if group:
+        print(f"\nStratifiedGroupKFold ({n_splits} folds, grouped by id_student)...")
+        cv = StratifiedGroupKFold(n_splits=n_splits, shuffle=True, random_state=42)
+        splits = list(cv.split(X, y, groups=df["id_student"]))
+    else:
+        print(f"\nStratifiedKFold ({n_splits} folds)...")
+        cv = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=42)
+        splits = list(cv.split(X, y))
+
+    # Full-data refits of both candidates run alongside the folds, so the
+    # final model doesn't add a sequential fit after CV
+    n_tasks = n_splits + 2
+
+    # One process per task, cores shared out so workers don't oversubscribe
+    n_cpu = cpu_count()
+    n_workers = n_tasks if n_jobs == -1 else n_jobs
+    n_workers = max(1, min(n_workers, n_tasks, n_cpu))
+    n_threads = max(1, n_cpu // n_workers)
+    print(f"Running {n_tasks} tasks on {n_workers} workers x {n_threads} threads")
+
+    # Longest tasks (full data) first
+    tasks = [
+        delayed(fit_full)(name, X, y, n_threads)
+        for name in ("random_forest", "xgboost")
+    ] + [
+        delayed(fit_fold)(fold, X, y, train_idx, val_idx, n_threads)
+        for fold, (train_idx, val_idx) in enumerate(splits)
+    ]
+    results = Parallel(n_jobs=n_workers, backend="loky")(tasks)
+    full_models = {"random_forest": results[0], "xgboost": results[1]}
+    fold_results = results[2:]
+
+    # ---------------------------------------------------------
+    # OUT-OF-FOLD PREDICTIONS
+    # ---------------------------------------------------------
+    oof = df[KEY_COLS].copy()
+    oof["dropout"] = y.values
+    oof["fold"] = -1
+    oof["rf_proba"] = np.nan
+    oof["xgb_proba"] = np.nan
+
+    for fold, val_idx, rf_proba, xgb_proba in fold_results:
+        oof.iloc[val_idx, oof.columns.get_loc("fold")] = fold
+        oof.iloc[val_idx, oof.columns.get_loc("rf_proba")] = rf_proba
+        oof.iloc[val_idx, oof.columns.get_loc("xgb_proba")] = xgb_proba
+
+    oof_path = os.path.join(MODEL_DIR, "oof_predictions.parquet")
+    oof.to_parquet(oof_path, index=False)
+    print(f"\nSaved out-of-fold predictions → {oof_path}")
+
+    rf_preds = (oof["rf_proba"] >= 0.5).astype(int)
+    xgb_preds = (oof["xgb_proba"] >= 0.5).astype(int)
+
+    print("\nRandomForest OOF Results:")
+    print(classification_report(y, rf_preds, digits=4))
+    print("RF OOF ROC AUC:", roc_auc_score(y, oof["rf_proba"]))
+    rf_recall = recall_score(y, rf_preds)
+
+    print("\nXGBoost OOF Results:")
+    print(classification_report(y, xgb_preds, digits=4))
+    print("XGB OOF ROC AUC:", roc_auc_score(y, oof["xgb_proba"]))
+    xgb_recall = recall_score(y, xgb_preds)
+
+    # ---------------------------------------------------------
+    # PICK BEST MODEL BY OOF RECALL
+    # ---------------------------------------------------------
+    print("\nSelecting best model...")
+
+    best_name = "xgboost" if xgb_recall >= rf_recall else "random_forest"
+    best = full_models[best_name]
+
+    out_path = os.path.join(MODEL_DIR, "best_model.joblib")
+    joblib.dump(best, out_path)
+    save_train_meta("cv", best_name)
+
     print(f"\nSaved BEST model ({best_name}) → {out_path}")
 
+    # The refit model has seen every row, so the index uses out-of-fold scores
+    print("\nBuilding risk index...")
+    build_index(df)
+
+
+def n_folds(value):
+    k = int(value)
+    if k < 2:
+        raise argparse.ArgumentTypeError(f"--cv needs at least 2 folds, got {k}")
+    return k
+
 
 if __name__ == "__main__":
-    train()
+    parser = argparse.ArgumentParser(description="Train dropout models.")
+    parser.add_argument("--cv", type=n_folds, default=None, metavar="K",
+                        help="use stratified K-fold CV instead of one 80/20 split")
+    parser.add_argument("--group", action="store_true",
+                        help="with --cv, keep each id_student in a single fold")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="with --cv, max parallel worker processes (default: one per task)")
+    args = parser.parse_args()
+
+    if args.cv is None and (args.group or args.jobs is not None):
+        parser.error("--group and --jobs require --cv K")
+    if args.jobs is not None and args.jobs < 1 and args.jobs != -1:
+        parser.error(f"--jobs must be >= 1 or -1, got {args.jobs}")
+
+    if args.cv is not None:
+        jobs = -1 if args.jobs is None else args.jobs
+        train_cv(n_splits=args.cv, group=args.group, n_jobs=jobs)
+    else:
+        train()